@@ -0,0 +1,229 @@
+# app/assets.py
+"""
+Fingerprinted, precompressed static assets and responsive image derivatives
+
+Run once before the workers start (run.py does this) or by hand:
+
+    python -m app.assets
+"""
+
+# native imports
+import gzip
+import json
+import os
+import re
+from hashlib import sha256
+from html import escape
+from io import BytesIO
+from mimetypes import guess_type
+
+# optional 3rd party imports
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+BUILD_DIR = os.path.join(STATIC_DIR, 'build')
+IMAGE_TYPES = ('.jpg', '.jpeg', '.png')
+IMAGE_WIDTHS = (480, 960, 1440)
+CSS_URL_RE = re.compile(r"url\((['\"]?)\.\./(images/[^'\")]+)\1\)")
+MANIFEST = 'manifest.json'
+
+# logical name ('css/style.css') -> built file, and image name -> derivatives
+manifest = {'files': {}, 'images': {}}
+# every built file name, the only paths /assets/ will serve
+served = set()
+
+
+def fingerprint(data):
+    return sha256(data).hexdigest()[:12]
+
+
+def is_built(name):
+    return os.path.isfile(os.path.join(BUILD_DIR, name))
+
+
+def write_once(name, data):
+    # names are content hashed, an existing file already holds these bytes
+    target = os.path.join(BUILD_DIR, name)
+    if not os.path.isfile(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + '.tmp', 'wb') as o:
+            o.write(data)
+        os.replace(target + '.tmp', target)
+
+
+def encode_image(image, fmt, quality):
+    buffer = BytesIO()
+    if fmt == 'JPEG':
+        image.convert('RGB').save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    elif fmt == 'WEBP':
+        image.save(buffer, 'WEBP', quality=quality, method=6)
+    else:
+        image.save(buffer, fmt, optimize=True)
+    return buffer.getvalue()
+
+
+def build_image(name, data, quality):
+    """
+    Full size copy plus narrower and WebP derivatives of one image
+    """
+    stem, ext = os.path.splitext(name)
+    digest = fingerprint(data)
+    entry = {'width': None, 'src': f'{stem}.{digest}{ext}', 'srcset': [], 'webp': []}
+    if Image is None:
+        write_once(entry['src'], data)
+        return entry
+    # opening only reads the header, pixels are decoded below if something is missing
+    with Image.open(os.path.join(STATIC_DIR, name)) as image:
+        fmt = 'JPEG' if ext.lower() in ('.jpg', '.jpeg') else image.format
+        entry['width'] = image.width
+        for width in [w for w in IMAGE_WIDTHS if w < image.width] + [image.width]:
+            entry['srcset'].append([width, entry['src'] if width == image.width else f'{stem}.{digest}.{width}w{ext}'])
+            entry['webp'].append([width, f'{stem}.{digest}.{width}w.webp'])
+        # names are content hashed, so existing files are already up to date
+        missing = {built for _, built in entry['srcset'] + entry['webp'] if not is_built(built)}
+        if not missing:
+            return entry
+        image.load()
+        if entry['src'] in missing:
+            full = encode_image(image, fmt, quality)
+            # keep the original when re-encoding does not pay off
+            write_once(entry['src'], full if len(full) < len(data) else data)
+        for (width, plain), (_, webp) in zip(entry['srcset'], entry['webp']):
+            if plain not in missing and webp not in missing:
+                continue
+            resized = image if width == image.width else \
+                image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            if plain != entry['src'] and plain in missing:
+                write_once(plain, encode_image(resized, fmt, quality))
+            if webp in missing:
+                write_once(webp, encode_image(resized, 'WEBP', quality))
+    return entry
+
+
+def build_css(name, data):
+    """
+    Point url(../images/..) at fingerprinted images, then write gzip and brotli copies
+    """
+    def rewrite(match):
+        built = manifest['images'].get(match.group(2))
+        return f"url({match.group(1)}../{built['src'] if built else match.group(2)}{match.group(1)})"
+    data = CSS_URL_RE.sub(rewrite, data.decode()).encode()
+    stem, ext = os.path.splitext(name)
+    built = f'{stem}.{fingerprint(data)}{ext}'
+    write_once(built, data)
+    write_once(built + '.gz', gzip.compress(data, 9))
+    if brotli is not None:
+        write_once(built + '.br', brotli.compress(data))
+    return built
+
+
+def build(quality=80):
+    """
+    Build every asset under app/static and write the manifest, files already built are not encoded again
+    """
+    images = {}
+    for name in sorted(os.listdir(os.path.join(STATIC_DIR, 'images'))):
+        if name.lower().endswith(IMAGE_TYPES):
+            logical = f'images/{name}'
+            with open(os.path.join(STATIC_DIR, logical), 'rb') as i:
+                images[logical] = build_image(logical, i.read(), quality)
+    manifest['images'] = images
+    manifest['files'] = {logical: entry['src'] for logical, entry in images.items()}
+    for name in sorted(os.listdir(os.path.join(STATIC_DIR, 'css'))):
+        if name.endswith('.css'):
+            logical = f'css/{name}'
+            with open(os.path.join(STATIC_DIR, logical), 'rb') as i:
+                manifest['files'][logical] = build_css(logical, i.read())
+    with open(os.path.join(BUILD_DIR, MANIFEST + '.tmp'), 'w') as o:
+        json.dump(manifest, o, indent=1)
+    os.replace(os.path.join(BUILD_DIR, MANIFEST + '.tmp'), os.path.join(BUILD_DIR, MANIFEST))
+    served.clear()
+    served.update(built_files())
+    return manifest
+
+
+def load():
+    """
+    Load the manifest written by build(), without one assets are served unhashed
+    """
+    try:
+        with open(os.path.join(BUILD_DIR, MANIFEST)) as i:
+            manifest.update(json.load(i))
+        served.clear()
+        served.update(built_files())
+    except FileNotFoundError:
+        print('Warning - Asset Manifest Not Found. Serving Originals.')
+
+
+def built_files():
+    for built in manifest['files'].values():
+        yield built
+    for entry in manifest['images'].values():
+        yield from (name for _, name in entry['srcset'] + entry['webp'])
+
+
+# Template helpers
+
+
+def asset_url(name):
+    built = manifest['files'].get(name)
+    return f'/assets/{built}' if built else f'/{name}'
+
+
+def image_url(name, width=None, webp=False):
+    """
+    Smallest derivative at least width wide, or the widest available
+    """
+    entry = manifest['images'].get(f'images/{name}')
+    if entry is None:
+        return f'/images/{name}'
+    candidates = entry['webp'] if webp else entry['srcset']
+    if not candidates or width is None:
+        return f"/assets/{entry['src']}"
+    chosen = next((built for w, built in candidates if w >= width), candidates[-1][1])
+    return f'/assets/{chosen}'
+
+
+def srcset(name, webp=False):
+    entry = manifest['images'].get(f'images/{name}')
+    if entry is None:
+        return ''
+    return ', '.join(f'/assets/{built} {w}w' for w, built in (entry['webp'] if webp else entry['srcset']))
+
+
+def picture(name, sizes='100vw', **attrs):
+    """
+    <picture> offering the WebP derivatives first and the resized originals as the <img> fallback
+    """
+    extra = ''.join(f' {key}="{escape(str(value))}"' for key, value in attrs.items())
+    entry = manifest['images'].get(f'images/{name}')
+    if entry is None or not entry['webp']:
+        return f'<img src="{image_url(name)}" srcset="{srcset(name)}" sizes="{sizes}"{extra}>'
+    return f'<picture><source type="image/webp" srcset="{srcset(name, webp=True)}" sizes="{sizes}">' \
+           f'<img src="{image_url(name)}" srcset="{srcset(name)}" sizes="{sizes}"{extra}></picture>'
+
+
+def background_style(name, width):
+    """
+    background-image declarations preferring WebP, older browsers keep the first one
+    """
+    fallback = image_url(name, width)
+    style = f'background-image: url({fallback})'
+    webp = image_url(name, width, webp=True)
+    if webp.endswith('.webp'):
+        style += f"; background-image: image-set(url({webp}) type('image/webp'), " \
+                 f"url({fallback}) type('{guess_type(fallback)[0]}'))"
+    return style
+
+
+if __name__ == '__main__':
+    built = build()
+    print(f"Built {len(built['files'])} assets in {BUILD_DIR}"
+          f"{'' if Image else ' (install Pillow for resized and WebP images)'}")
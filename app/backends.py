@@ -0,0 +1,101 @@
+# app/backends.py
+
+# native imports
+import asyncio
+from contextlib import asynccontextmanager
+
+# 3rd party imports
+import sqlalchemy as sa
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+
+# DB_TYPE -> async driver and pool defaults, DB_POOL_* config overrides them
+BACKENDS = {
+    'mysql': {'driver': 'mysql+aiomysql', 'pool_size': 10},
+    'postgresql': {'driver': 'postgresql+asyncpg', 'pool_size': 10},
+    # WAL lets every reader run beside the one writer, more connections only add readers
+    'sqlite': {'driver': 'sqlite+aiosqlite', 'pool_size': 5},
+}
+
+
+def sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+class Backend:
+    """
+    Async engine for one DB_URI, picking aiomysql, asyncpg or aiosqlite by its scheme
+
+    SQLite writes are queued behind a single writer, reads use the pool concurrently.
+    """
+
+    def __init__(self, uri, pool_size=None, timeout=5, recycle=3600):
+        url = make_url(uri)
+        self.type = url.get_backend_name()
+        if self.type not in BACKENDS:
+            raise ValueError(f'Unsupported database type {self.type}')
+        defaults = BACKENDS[self.type]
+        url = url.set(drivername=defaults['driver'])
+        self.pool_size = pool_size or defaults['pool_size']
+        kwargs = {'pool_size': self.pool_size, 'max_overflow': 0, 'pool_timeout': timeout,
+                  'pool_recycle': recycle}
+        self.write_lock = None
+        if self.type == 'sqlite':
+            self.write_lock = asyncio.Lock()
+            kwargs['connect_args'] = {'timeout': timeout}
+            if url.database in (None, '', ':memory:'):
+                # one shared connection, a new one would be a new empty database
+                kwargs = {'poolclass': StaticPool, 'connect_args': kwargs['connect_args']}
+                self.pool_size = 1
+            else:
+                kwargs['poolclass'] = AsyncAdaptedQueuePool
+        self.engine = create_async_engine(url, **kwargs)
+        if self.type == 'sqlite':
+            sa.event.listen(self.engine.sync_engine, 'connect', sqlite_pragmas)
+
+    @property
+    def size(self):
+        pool = self.engine.pool
+        # StaticPool shares its one connection and counts no check in/out
+        if not hasattr(pool, 'checkedin'):
+            return self.pool_size
+        return pool.checkedin() + pool.checkedout()
+
+    @property
+    def freesize(self):
+        pool = self.engine.pool
+        if not hasattr(pool, 'checkedin'):
+            return self.pool_size
+        return pool.checkedin()
+
+    async def warm(self, count):
+        """
+        Open count connections up front so the first requests do not pay for them
+        """
+        async def touch():
+            async with self.engine.connect() as con:
+                await con.execute(sa.text('SELECT 1'))
+        await asyncio.gather(*(touch() for _ in range(min(count, self.pool_size))))
+
+    @asynccontextmanager
+    async def connect(self, write=False):
+        """
+        A read connection, or for write=True a transaction committed on exit
+        """
+        if not write:
+            async with self.engine.connect() as con:
+                yield con
+        elif self.write_lock is None:
+            async with self.engine.begin() as con:
+                yield con
+        else:
+            async with self.write_lock:
+                async with self.engine.begin() as con:
+                    yield con
+
+    async def close(self):
+        await self.engine.dispose()
@@ -0,0 +1,83 @@
+# app/cache.py
+
+# native imports
+import gzip
+from collections import OrderedDict, namedtuple
+from email.utils import formatdate, parsedate_to_datetime
+from hashlib import sha1
+from time import monotonic, time
+
+# 3rd party imports
+from sanic.response import HTTPResponse, raw
+
+CachedPage = namedtuple('CachedPage', 'body gzipped etag last_modified content_type expires')
+
+
+class PageCache:
+    """
+    In-process LRU cache of rendered pages with a TTL per entry
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._pages = OrderedDict()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key):
+        page = self._pages.get(key)
+        if page is None:
+            return None
+        if page.expires < monotonic():
+            del self._pages[key]
+            return None
+        self._pages.move_to_end(key)
+        return page
+
+    def set(self, key, body, content_type):
+        page = CachedPage(body=body, gzipped=gzip.compress(body), etag=f'"{sha1(body).hexdigest()}"',
+                          last_modified=int(time()), content_type=content_type, expires=monotonic() + self.ttl)
+        self._pages[key] = page
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.maxsize:
+            self._pages.popitem(last=False)
+        return page
+
+    def clear(self):
+        self._pages.clear()
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Evaluate If-None-Match / If-Modified-Since against a cached representation
+    """
+    match = request.headers.get('If-None-Match')
+    if match is not None:
+        return match.strip() == '*' or etag in (tag.strip() for tag in match.split(','))
+    since = request.headers.get('If-Modified-Since')
+    if since is not None:
+        try:
+            return last_modified <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cached_response(request, page):
+    gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+    # a strong ETag names exact bytes, so the gzip copy gets one of its own
+    etag = f'{page.etag[:-1]}-gz"' if gzipped else page.etag
+    headers = {'ETag': etag,
+               'Last-Modified': formatdate(page.last_modified, usegmt=True),
+               'Cache-Control': 'public, no-cache',
+               'Vary': 'Accept-Encoding'}
+    if not_modified(request, etag, page.last_modified):
+        return HTTPResponse(status=304, headers=headers)
+    body = page.body
+    if gzipped:
+        headers['Content-Encoding'] = 'gzip'
+        body = page.gzipped
+    # raw() takes the bytes as they are, HTTPResponse(body=...) would send their repr on Sanic 19
+    return raw(body, headers=headers, content_type=page.content_type)
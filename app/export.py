@@ -0,0 +1,105 @@
+# app/export.py
+"""
+Render published posts to plain HTML files that can be served without the database
+"""
+
+# native imports
+import asyncio
+import gzip
+import json
+import os
+from xml.sax.saxutils import escape
+
+# local imports
+from app.models import get_post_by_url, list_export_posts, list_posts
+
+STATE = '.export.json'
+
+
+def write_page(out_dir, name, html, compress):
+    target = os.path.join(out_dir, name)
+    data = html.encode()
+    for filename, content in ((target, data), (target + '.gz', gzip.compress(data, 9) if compress else None)):
+        if content is None:
+            continue
+        with open(filename + '.tmp', 'wb') as o:
+            o.write(content)
+        os.replace(filename + '.tmp', filename)
+
+
+async def render_page(out_dir, name, template, compress, **context):
+    # rendering and gzip level 9 run on a thread, a server exporting in the background keeps answering
+    await asyncio.get_event_loop().run_in_executor(
+        None, lambda: write_page(out_dir, name, template.render(**context), compress))
+
+
+def remove_page(out_dir, name):
+    for filename in (name, name + '.gz'):
+        try:
+            os.remove(os.path.join(out_dir, filename))
+        except FileNotFoundError:
+            pass
+
+
+def sitemap(site_url, posts):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+             f'<url><loc>{escape(site_url)}/</loc></url>']
+    for url, modified in posts:
+        lastmod = f'<lastmod>{modified[:10]}</lastmod>' if modified else ''
+        lines.append(f'<url><loc>{escape(site_url)}/{escape(url)}</loc>{lastmod}</url>')
+    lines.append('</urlset>')
+    return '\n'.join(lines) + '\n'
+
+
+async def export_site(env, out_dir, site_url, compress=True, full=False):
+    """
+    Render changed posts, the front page and sitemap.xml into out_dir
+
+    Only posts whose post_modified differs from the previous export are rendered
+    again, posts no longer published are removed. Returns the number rendered.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    state_file = os.path.join(out_dir, STATE)
+    try:
+        with open(state_file) as i:
+            previous = {} if full else json.load(i)
+    except FileNotFoundError:
+        previous = {}
+    current = {post['post_url']: post['post_modified'].isoformat() if post['post_modified'] else None
+               for post in await list_export_posts()}
+    changed = [url for url, modified in current.items() if url not in previous or previous[url] != modified]
+    post_template = env.get_template('post.html')
+    for url in changed:
+        fetch = await get_post_by_url(url)
+        if fetch is not None:
+            await render_page(out_dir, f'{url}.html', post_template, compress, post=fetch)
+    for url in set(previous) - set(current):
+        remove_page(out_dir, f'{url}.html')
+    if changed or previous.keys() != current.keys() or not os.path.isfile(os.path.join(out_dir, 'index.html')):
+        fetch, next_cursor = await list_posts()
+        await render_page(out_dir, 'index.html', env.get_template('index.html'), compress,
+                          page=fetch, next_cursor=next_cursor)
+        await asyncio.get_event_loop().run_in_executor(
+            None, write_page, out_dir, 'sitemap.xml', sitemap(site_url, sorted(current.items())), compress)
+    with open(state_file + '.tmp', 'w') as o:
+        json.dump(current, o)
+    os.replace(state_file + '.tmp', state_file)
+    return len(changed)
+
+
+def exported_file(out_dir, request_path):
+    """
+    File for a GET path in an export, or None so the request is handled dynamically
+    """
+    if request_path == '/':
+        name = 'index.html'
+    elif request_path == '/sitemap.xml':
+        name = 'sitemap.xml'
+    else:
+        name = request_path.strip('/')
+        if not name or '/' in name or name.startswith('.'):
+            return None
+        name += '.html'
+    location = os.path.join(out_dir, name)
+    return location if os.path.isfile(location) else None
@@ -0,0 +1,151 @@
+# app/feeds.py
+
+# native imports
+import asyncio
+import gzip
+from bisect import bisect_left, insort
+from datetime import timezone
+from email.utils import format_datetime
+from hashlib import sha1
+from time import time
+from xml.sax.saxutils import escape
+
+# local imports
+from app.cache import CachedPage
+
+CONTENT_TYPES = {'rss': 'application/rss+xml', 'atom': 'application/atom+xml', 'sitemap': 'application/xml'}
+
+
+def utc(date):
+    # post dates are stored naive in server local time (datetime.now()), astimezone() reads them as such
+    return date.astimezone(timezone.utc)
+
+
+class Feeds:
+    """
+    /feed.xml, /atom.xml and /sitemap.xml kept in memory and patched one post at a time
+
+    load is a coroutine function returning the published posts. Each post's <item>,
+    <entry> and <url> are formatted once, a write only replaces that post's fragments
+    and drops the assembled documents, which are joined again on their next request.
+    """
+
+    def __init__(self, load, size=20):
+        self.load_func = load
+        self.size = size
+        self.site_url = ''
+        self.stamp = None
+        self.loaded = False
+        # id -> (post_date, post_modified, {'rss': item, 'atom': entry, 'sitemap': url})
+        self.posts = {}
+        # (post_date, id) ascending, feeds take the newest from the end
+        self.keys = []
+        self.documents = {}
+        # when the documents last changed, their Last-Modified
+        self.changed = 0
+        self._lock = None
+        self._reload = False
+
+    def fragments(self, post):
+        link = escape(f"{self.site_url}/{post['post_url']}")
+        title = escape(post.get('post_title') or '')
+        date, modified = utc(post['post_date']), utc(post.get('post_modified') or post['post_date'])
+        return {'rss': f'<item><title>{title}</title><link>{link}</link><guid isPermaLink="true">{link}</guid>'
+                       f'<pubDate>{format_datetime(date)}</pubDate></item>',
+                'atom': f'<entry><title>{title}</title><link href="{link}"/><id>{link}</id>'
+                        f'<published>{date.isoformat()}</published><updated>{modified.isoformat()}</updated></entry>',
+                'sitemap': f'<url><loc>{link}</loc><lastmod>{modified.date().isoformat()}</lastmod></url>'}
+
+    def _add(self, post):
+        self._discard(post['id'])
+        if post.get('post_status') != 'publish' or not post.get('post_url') or post.get('post_date') is None:
+            return
+        self.posts[post['id']] = (post['post_date'], post.get('post_modified') or post['post_date'],
+                                  self.fragments(post))
+        insort(self.keys, (post['post_date'], post['id']))
+
+    def _discard(self, post_id):
+        previous = self.posts.pop(post_id, None)
+        if previous is not None:
+            del self.keys[bisect_left(self.keys, (previous[0], post_id))]
+
+    async def load(self, stamp=None):
+        """
+        Read every published post, again if a write arrived while reading
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._reload = True
+            while self._reload:
+                self._reload = False
+                rows = await self.load_func()
+                self.posts, self.keys = {}, []
+                for row in rows:
+                    self._add(row)
+                self.invalidate()
+                self.loaded = True
+            self.stamp = stamp
+
+    def _loading(self):
+        # a load in progress would overwrite the patch, have it read again instead
+        if not self.loaded or (self._lock is not None and self._lock.locked()):
+            self._reload = True
+            return True
+        return False
+
+    def update(self, post):
+        """
+        Patch in a written post, unpublished ones are dropped
+        """
+        if self._loading():
+            return
+        self._add(post)
+        self.invalidate()
+
+    def remove(self, post_id):
+        if self._loading():
+            return
+        self._discard(post_id)
+        self.invalidate()
+
+    def invalidate(self):
+        self.documents = {}
+        self.changed = time()
+
+    def render(self, name, title):
+        title = escape(title)
+        if name == 'sitemap':
+            ids = sorted(self.posts)
+            parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+                     '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+                     f'<url><loc>{escape(self.site_url)}/</loc></url>']
+        else:
+            ids = [post_id for _, post_id in reversed(self.keys[-self.size:])]
+            if name == 'rss':
+                parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel>'
+                         f'<title>{title}</title><link>{escape(self.site_url)}/</link><description>{title}</description>']
+            else:
+                updated = max((utc(self.posts[post_id][1]) for post_id in ids), default=None)
+                parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">'
+                         f'<title>{title}</title><link href="{escape(self.site_url)}/"/>'
+                         f'<link rel="self" href="{escape(self.site_url)}/atom.xml"/><id>{escape(self.site_url)}/</id>'
+                         f'<updated>{updated.isoformat() if updated else "1970-01-01T00:00:00+00:00"}</updated>']
+        parts.extend(self.posts[post_id][2][name] for post_id in ids)
+        parts.append({'rss': '</channel></rss>', 'atom': '</feed>', 'sitemap': '</urlset>'}[name])
+        return '\n'.join(parts).encode() + b'\n'
+
+    def document(self, name, title):
+        """
+        CachedPage of rss, atom or sitemap, assembled once per change
+
+        The ETag derives from the content, so every worker hands out the same. Last-Modified
+        is the last change seen by this worker, a new title or a removed post moves it too.
+        """
+        page = self.documents.get(name)
+        if page is None:
+            body = self.render(name, title)
+            page = CachedPage(body=body, gzipped=gzip.compress(body), etag=f'"{sha1(body).hexdigest()}"',
+                              last_modified=int(self.changed), content_type=CONTENT_TYPES[name], expires=None)
+            self.documents[name] = page
+        return page
@@ -23,7 +23,7 @@ class WelcomeForm(SanicForm):
                                          Length(min=5, max=25, message='Password needs to be 5-25 characters long.')])
     confirm = PasswordField('Repeat Password')
     email = StringField('Your E-mail', validators=[DataRequired(), Email(message='Invalid Email')])
-    seo = BooleanField('Hide website from search engines?', validators=[DataRequired()])
+    seo = BooleanField('Hide website from search engines?', default=True)
     submit = SubmitField('Install')
 
 
@@ -37,3 +37,15 @@ class DatabaseForm(SanicForm):
     password = PasswordField('Password')
     host = StringField('Host:Port')
     submit = SubmitField('Submit')
+
+
+class SettingsForm(SanicForm):
+    """
+    Admin Blog Settings Form
+    """
+    title = StringField('Site Title', validators=[DataRequired()])
+    seo_hidden = BooleanField('Hide website from search engines?')
+    allow_comments = BooleanField('Allow comments?')
+    short_urls = BooleanField('Short URLs?')
+    maintenance_mode = BooleanField('Maintenance mode?')
+    submit = SubmitField('Save')
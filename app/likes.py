@@ -0,0 +1,92 @@
+# app/likes.py
+
+# native imports
+import asyncio
+from collections import Counter
+
+
+class LikeBuffer:
+    """
+    Buffers post_likes increments in memory and writes them in batches
+
+    flush is a coroutine function taking {post id: increment}. Stored counts looked
+    up through lookup() are kept until the next flush, so reading a count costs one
+    query per post and interval.
+    """
+
+    def __init__(self, flush, interval=5, threshold=1000):
+        self.flush_func = flush
+        self.interval = interval
+        self.threshold = threshold
+        self.pending = Counter()
+        self.pending_total = 0
+        self.in_flight = Counter()
+        # post_url -> {'id', 'post_likes'} as last read from the database
+        self.stored = {}
+        self._timer = None
+        self._flushing = None
+
+    def add(self, post_id, n=1):
+        self.pending[post_id] += n
+        self.pending_total += n
+        if self.pending_total >= self.threshold:
+            self._schedule()
+
+    def _schedule(self):
+        # at most one flush runs at a time, callers share it
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.ensure_future(self.flush())
+        return self._flushing
+
+    def unflushed(self, post_id):
+        """
+        Likes for post_id not yet visible in the database
+        """
+        return self.pending.get(post_id, 0) + self.in_flight.get(post_id, 0)
+
+    async def lookup(self, url, load):
+        """
+        Stored id and post_likes of url, load(url) reads them when not kept, None for unknown posts
+        """
+        found = self.stored.get(url)
+        if found is None:
+            found = await load(url)
+            if found is not None:
+                self.stored[url] = found
+        return found
+
+    async def flush(self):
+        if self.in_flight:
+            return
+        if not self.pending:
+            # nothing to write here, other workers' likes are read again all the same
+            self.stored.clear()
+            return
+        self.in_flight, self.pending, self.pending_total = self.pending, Counter(), 0
+        try:
+            await self.flush_func(dict(self.in_flight))
+        except Exception as error:
+            # keep the batch for the next attempt
+            print(f'Like Flush Broke! {error}')
+            self.pending.update(self.in_flight)
+            self.pending_total = sum(self.pending.values())
+        finally:
+            self.in_flight = Counter()
+            self.stored.clear()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            # shielded so stop() cannot cancel a batch halfway through its transaction
+            await asyncio.shield(self._schedule())
+
+    def start(self, loop):
+        self._timer = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flushing is not None:
+            await self._flushing
+        await self.flush()
@@ -0,0 +1,127 @@
+# app/metrics.py
+
+# native imports
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+# every metric created below, in exposition order
+registry = []
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def _labels(key, extra=None):
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    text = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for k, v in pairs)
+    return '{' + text + '}'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        registry.append(self)
+
+    def samples(self):
+        return []
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{labels} {value}' for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """
+    Monotonic count per label set
+    """
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self.values = defaultdict(float)
+
+    def inc(self, n=1, **labels):
+        self.values[tuple(sorted(labels.items()))] += n
+
+    def samples(self):
+        return [(self.name, _labels(key), value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down
+    """
+    kind = 'gauge'
+
+    def dec(self, n=1, **labels):
+        self.inc(-n, **labels)
+
+    def set(self, value, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram(Metric):
+    """
+    Cumulative bucketed observations, e.g. latencies in seconds
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+        # label set -> [per bucket counts (+inf last), sum]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', _labels(key, ('le', bound)), cumulative))
+            samples.append((f'{self.name}_sum', _labels(key), total))
+            samples.append((f'{self.name}_count', _labels(key), cumulative))
+        return samples
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format
+    """
+    return '\n'.join(metric.render() for metric in registry) + '\n'
+
+
+# HTTP
+http_requests = Counter('http_requests_total', 'Requests served by route, method and status.')
+http_latency = Histogram('http_request_duration_seconds', 'Request latency by route.')
+http_in_flight = Gauge('http_requests_in_flight', 'Requests currently being handled.')
+# Templates
+render_latency = Histogram('template_render_duration_seconds', 'Jinja render time by template.')
+# Database
+db_latency = Histogram('db_query_duration_seconds', 'Query time by statement and table.')
+db_acquired = Counter('db_connections_acquired_total', 'Connections borrowed from the pool.')
+db_acquire_latency = Histogram('db_connection_acquire_seconds', 'Time spent waiting for a pooled connection.')
+db_pool_size = Gauge('db_pool_connections', 'Pooled connections by state.')
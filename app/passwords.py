@@ -0,0 +1,141 @@
+# app/passwords.py
+
+# native imports
+import asyncio
+import hashlib
+import hmac
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from secrets import token_bytes
+from time import monotonic
+
+# scrypt cost, about 16MB and a few tens of milliseconds per hash
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+# used when the linked OpenSSL has no scrypt
+PBKDF2_ITERATIONS = 260000
+
+
+def hash_password(password):
+    """
+    Salted hash of password as 'scrypt$n$r$p$salt$hash', or 'pbkdf2_sha256$iterations$salt$hash'
+    """
+    salt = token_bytes(16)
+    if hasattr(hashlib, 'scrypt'):
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P,
+                                maxmem=2 * 128 * SCRYPT_N * SCRYPT_R)
+        return f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}'
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PBKDF2_ITERATIONS)
+    return f'pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}'
+
+
+def is_hashed(stored):
+    return stored.startswith(('scrypt$', 'pbkdf2_sha256$'))
+
+
+def verify_password(password, stored):
+    """
+    Check password against a value from hash_password
+
+    Rows created before passwords were hashed hold the plain password, those are
+    compared as is so the caller can replace them with a hash.
+    """
+    if not stored:
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    scheme, *params = stored.split('$')
+    if scheme == 'scrypt':
+        n, r, p, salt, expected = params
+        n, r, p = int(n), int(r), int(p)
+        digest = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=n, r=r, p=p, maxmem=2 * 128 * n * r)
+    else:
+        iterations, salt, expected = params
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(digest, bytes.fromhex(expected))
+
+
+class PasswordHasher:
+    """
+    Runs hash_password / verify_password on a small thread pool, off the event loop
+
+    hashlib releases the GIL while hashing, so the loop keeps serving readers meanwhile.
+    """
+
+    def __init__(self, threads=2):
+        self.threads = threads
+        self._executor = None
+        # verified against unknown usernames so they take as long as known ones
+        self._dummy = None
+
+    @property
+    def executor(self):
+        # created on first use so forked workers each get their own threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='password')
+        return self._executor
+
+    async def hash(self, password):
+        return await asyncio.get_event_loop().run_in_executor(self.executor, hash_password, password)
+
+    async def verify(self, password, stored):
+        """
+        verify_password in the pool, stored None (no such user) is always False
+        """
+        if stored is None:
+            if self._dummy is None:
+                self._dummy = await self.hash('')
+            await asyncio.get_event_loop().run_in_executor(self.executor, verify_password, password, self._dummy)
+            return False
+        return await asyncio.get_event_loop().run_in_executor(self.executor, verify_password, password, stored)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class TokenBucket:
+    """
+    Per key token buckets, each allows burst attempts then one more every refill seconds
+
+    Buckets are kept in the order they were last touched, at most maxsize of them,
+    the least recently touched ones go first.
+    """
+
+    def __init__(self, burst=5, refill=12, maxsize=10000):
+        self.burst = burst
+        self.refill = refill
+        self.maxsize = maxsize
+        self.buckets = OrderedDict()
+
+    def _store(self, key, tokens, now):
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        # oldest stamps first, so fully refilled buckets (no state worth keeping) sit at the front
+        full = self.burst * self.refill
+        while self.buckets and now - next(iter(self.buckets.values()))[1] >= full:
+            self.buckets.popitem(last=False)
+        while len(self.buckets) > self.maxsize:
+            self.buckets.popitem(last=False)
+
+    def allow(self, key):
+        """
+        Take a token for key, False when none is left
+        """
+        now = monotonic()
+        tokens, stamp = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - stamp) / self.refill)
+        if tokens < 1:
+            self._store(key, tokens, now)
+            return False
+        self._store(key, tokens - 1, now)
+        return True
+
+    def retry_after(self, key):
+        """
+        Seconds until key has a token again
+        """
+        tokens, _ = self.buckets.get(key, (self.burst, 0))
+        return max(0, int((1 - tokens) * self.refill) + 1)
@@ -0,0 +1,132 @@
+# app/search.py
+
+# native imports
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+TOKEN_RE = re.compile(r'\w+')
+# a title match counts as this many body matches
+TITLE_WEIGHT = 3
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall((text or '').lower()) if len(token) > 1]
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over post_title and post_content ranked with BM25
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {post id: weighted term frequency}
+        self.lengths = {}  # post id -> weighted document length
+        self.terms = {}  # post id -> indexed terms, so removal skips the full vocabulary
+        self.docs = {}  # post id -> fields needed to render a result
+        self.total_length = 0
+        # posts_stamp() of the table state the index was built from
+        self.stamp = None
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, post):
+        """
+        Index (or re-index) one post, unpublished posts are only removed
+        """
+        post_id = post['id']
+        self.remove(post_id)
+        if post.get('post_status') != 'publish':
+            return
+        terms = Counter(tokenize(post.get('post_content')))
+        for token in tokenize(post.get('post_title')):
+            terms[token] += TITLE_WEIGHT
+        for term, freq in terms.items():
+            self.postings[term][post_id] = freq
+        self.terms[post_id] = list(terms)
+        length = sum(terms.values())
+        self.lengths[post_id] = length
+        self.total_length += length
+        date = post.get('post_date')
+        self.docs[post_id] = {'id': post_id,
+                              'post_title': post.get('post_title'),
+                              'post_url': post.get('post_url'),
+                              'post_image': post.get('post_image'),
+                              'post_date': date.isoformat() if hasattr(date, 'isoformat') else date,
+                              'post_excerpt': (post.get('post_content') or '')[:200]}
+
+    def remove(self, post_id):
+        length = self.lengths.pop(post_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        del self.docs[post_id]
+        for term in self.terms.pop(post_id):
+            del self.postings[term][post_id]
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def clear(self):
+        self.postings.clear()
+        self.lengths.clear()
+        self.terms.clear()
+        self.docs.clear()
+        self.total_length = 0
+        self.stamp = None
+
+    def search(self, query, page=1, per_page=10):
+        """
+        Return one page of matching posts, best first, and the total match count
+        """
+        count = len(self.docs)
+        if not count:
+            return [], 0
+        avg_length = self.total_length / count
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for post_id, freq in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[post_id] / avg_length)
+                scores[post_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        start = (page - 1) * per_page
+        return [self.docs[post_id] for post_id in ranked[start:start + per_page]], len(ranked)
+
+    def save(self, filename):
+        """
+        Persist the index along with the stamp it was built from
+        """
+        data = {'stamp': self.stamp,
+                'docs': list(self.docs.values()),
+                'lengths': list(self.lengths.items()),
+                'postings': {term: list(docs.items()) for term, docs in self.postings.items()}}
+        # workers of one server save on the same shutdown, each through a file of its own
+        tmp = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as o:
+            json.dump(data, o)
+        os.replace(tmp, filename)
+
+    def load(self, filename):
+        """
+        Load a saved index, returning the stamp it was saved with
+        """
+        with open(filename) as i:
+            data = json.load(i)
+        self.clear()
+        self.docs = {doc['id']: doc for doc in data['docs']}
+        self.lengths = dict(data['lengths'])
+        self.total_length = sum(self.lengths.values())
+        for term, docs in data['postings'].items():
+            self.postings[term] = dict(docs)
+            for post_id, _ in docs:
+                self.terms.setdefault(post_id, []).append(term)
+        self.stamp = data['stamp']
+        return self.stamp
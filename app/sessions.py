@@ -0,0 +1,178 @@
+# app/sessions.py
+
+# native imports
+import asyncio
+import json
+import os
+import sqlite3
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from secrets import token_urlsafe
+from time import time
+
+
+class SQLiteSessionStore:
+    """
+    Session rows in a local SQLite file in WAL mode, shared by all worker processes
+
+    The methods block, coroutines go through run() which calls them on a single
+    thread, so a write held by another worker never stalls the event loop.
+    busy_timeout stays short, a session write is small and a stuck lock is better reported.
+    """
+
+    def __init__(self, filename='sessions.db', expiry=600, busy_timeout=0.25):
+        self.filename = filename
+        self.expiry = expiry
+        self.busy_timeout = busy_timeout
+        self._con = None
+        self._pid = None
+        self._executor = None
+
+    @property
+    def executor(self):
+        # threads do not survive a fork either, one per worker, one thread for the one connection
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='session')
+            self._con = None
+            self._pid = os.getpid()
+        return self._executor
+
+    async def run(self, method, *args):
+        return await asyncio.get_event_loop().run_in_executor(self.executor, method, *args)
+
+    @property
+    def con(self):
+        # connections must not cross a fork, open one per worker on first use
+        if self._con is None or self._pid != os.getpid():
+            con = sqlite3.connect(self.filename, isolation_level=None, check_same_thread=False,
+                                  timeout=self.busy_timeout)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            con.execute('CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT, expires REAL)')
+            con.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions (expires)')
+            self._con, self._pid = con, os.getpid()
+        return self._con
+
+    def load(self, sid):
+        """
+        Return (data, expires) of a live session or None
+        """
+        row = self.con.execute('SELECT data, expires FROM sessions WHERE sid = ? AND expires > ?',
+                               (sid, time())).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, sid, data):
+        self.con.execute('INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+                         (sid, json.dumps(data), time() + self.expiry))
+
+    def delete(self, sid):
+        self.con.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def purge(self):
+        """
+        Drop every expired session in one statement
+        """
+        return self.con.execute('DELETE FROM sessions WHERE expires <= ?', (time(),)).rowcount
+
+
+class RequestSession(MutableMapping):
+    """
+    Session dict of one request, marked dirty on change
+
+    found is the (data, expires) the store returned for sid, read before the handler
+    runs since sanic_auth reads the session synchronously. Only assignment and
+    deletion mark it dirty, reassign nested values after editing them.
+    """
+
+    def __init__(self, sid, found=None):
+        self.sid = sid
+        self.expires = None
+        self.modified = False
+        self._found = found
+        self._data = None
+        # the store could not be read, the stored session must not be overwritten unasked
+        self.unavailable = False
+
+    @property
+    def data(self):
+        if self._data is None:
+            found = self._found
+            if found is None:
+                # unknown or expired id, never reuse an id the client picked
+                self.sid = None
+                self._data = {}
+            else:
+                self._data, self.expires = found
+        return self._data
+
+    @property
+    def accessed(self):
+        return self._data is not None
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class SessionInterface:
+    """
+    Request/response middleware pair around a session store
+
+    Requests without a cookie, and those opened with load=False (static files), cost
+    no store access. A session is written only when it was used and changed, or when
+    half its lifetime has passed.
+    """
+
+    def __init__(self, store, cookie_name='session'):
+        self.store = store
+        self.cookie_name = cookie_name
+
+    async def open(self, request, load=True):
+        # without load the request gets an empty session, the cookie is left as it is
+        sid = request.cookies.get(self.cookie_name) if load else None
+        found = None
+        if sid:
+            try:
+                found = await self.store.run(self.store.load, sid)
+            except sqlite3.OperationalError as error:
+                # locked past busy_timeout, serve this request without the session but keep the cookie
+                print(f'Session Load Broke! {error}')
+                request['session'] = RequestSession(None)
+                request['session'].unavailable = True
+                return
+        request['session'] = RequestSession(sid, found)
+
+    async def save(self, request, response):
+        session = request.get('session')
+        if session is None or not session.accessed or (session.unavailable and not session.modified):
+            return
+        if session.modified and not session:
+            if session.sid:
+                await self.store.run(self.store.delete, session.sid)
+                response.cookies[self.cookie_name] = ''
+                response.cookies[self.cookie_name]['max-age'] = 0
+            return
+        refresh = session.expires is not None and session.expires - time() < self.store.expiry / 2
+        if not (session.modified or refresh):
+            return
+        if session.sid is None:
+            session.sid = token_urlsafe(32)
+        await self.store.run(self.store.save, session.sid, dict(session))
+        response.cookies[self.cookie_name] = session.sid
+        response.cookies[self.cookie_name]['httponly'] = True
+        response.cookies[self.cookie_name]['max-age'] = self.store.expiry
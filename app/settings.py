@@ -0,0 +1,70 @@
+# app/settings.py
+
+# native imports
+import os
+from collections import namedtuple
+from secrets import token_hex
+
+BlogSettings = namedtuple('BlogSettings', ['title', 'owner', 'seo_hidden', 'https', 'short_urls', 'allow_comments',
+                                           'maintenance_mode'])
+# column defaults of blog_settings, used until setup has created the row
+DEFAULTS = BlogSettings(title='My Blog', owner=None, seo_hidden=True, https=False, short_urls=False,
+                        allow_comments=False, maintenance_mode=False)
+
+
+class SettingsSnapshot:
+    """
+    Immutable copy of the blog_settings row, attributes read through to it without a query
+
+    A write replaces the whole snapshot in one assignment and rewrites the stamp file,
+    other workers compare the stamp with their own from check() and reload on a mismatch.
+    """
+
+    def __init__(self, load, stamp_file='settings.stamp'):
+        self.load_func = load
+        self.stamp_file = stamp_file
+        # None until the blog has been set up
+        self.current = None
+        self.version = None
+        # True once the row has been read, current None then really means no setup yet
+        self.loaded = False
+
+    def __getattr__(self, name):
+        return getattr(self.current or DEFAULTS, name)
+
+    def swap(self, row):
+        self.current = None if row is None else BlogSettings(**{field: row.get(field, getattr(DEFAULTS, field))
+                                                                for field in BlogSettings._fields})
+
+    def read_stamp(self):
+        try:
+            with open(self.stamp_file) as i:
+                return i.read()
+        except FileNotFoundError:
+            return None
+
+    def bump(self):
+        """
+        Tell the other workers to reload
+        """
+        version = token_hex(8)
+        with open(self.stamp_file + '.tmp', 'w') as o:
+            o.write(version)
+        os.replace(self.stamp_file + '.tmp', self.stamp_file)
+        self.version = version
+
+    async def load(self):
+        # stamp first, a write landing during the query then triggers another load
+        version = self.read_stamp()
+        self.swap(await self.load_func())
+        self.version = version
+        self.loaded = True
+
+    async def check(self):
+        """
+        Reload when another worker changed the settings, returns True if it did
+        """
+        if self.read_stamp() == self.version:
+            return False
+        await self.load()
+        return True
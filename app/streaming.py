@@ -0,0 +1,70 @@
+# app/streaming.py
+
+# native imports
+import zlib
+from time import perf_counter
+
+# 3rd party imports
+from jinja2 import FileSystemBytecodeCache
+from sanic.response import stream
+from sanic_compress import Compress
+
+
+class StreamingCompress(Compress):
+    """
+    sanic_compress gzips whole bodies, streamed responses compress themselves as they are written
+    """
+
+    async def _compress_response(self, request, response):
+        if getattr(response, 'body', None) is None:
+            return response
+        return await super()._compress_response(request, response)
+
+
+def precompile(env, cache_dir=None):
+    """
+    Compile every template now instead of on its first request
+
+    With cache_dir the bytecode is written there too, so workers started later
+    load it instead of compiling again.
+    """
+    if cache_dir:
+        env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    for name in env.list_templates():
+        env.get_template(name)
+
+
+def stream_template(template, context, gzipped=False, chunk_size=4096, on_complete=None):
+    """
+    Chunked response written while template renders, on_complete gets the full html once done
+
+    Output is sent every chunk_size characters, the <head> shell leaves before the
+    rest of the page has been built. on_complete also gets the seconds spent rendering,
+    time waiting on the client is left out.
+    """
+    async def write_page(response):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzipped else None
+        parts, buffered = [], 0
+
+        async def send(data, final=False):
+            data = data.encode()
+            if compressor is not None:
+                data = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+            if data:
+                await response.write(data)
+
+        start, rendering, began = 0, 0.0, perf_counter()
+        for chunk in template.generate(**context):
+            parts.append(chunk)
+            buffered += len(chunk)
+            if buffered >= chunk_size:
+                rendering += perf_counter() - began
+                await send(''.join(parts[start:]))
+                start, buffered, began = len(parts), 0, perf_counter()
+        rendering += perf_counter() - began
+        await send(''.join(parts[start:]), final=True)
+        if on_complete is not None:
+            on_complete(''.join(parts), rendering)
+
+    headers = {'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'} if gzipped else {}
+    return stream(write_page, headers=headers, content_type='text/html; charset=utf-8')
@@ -0,0 +1,164 @@
+# app/transfer.py
+"""
+Stream posts between blog_posts and WordPress WXR or JSON Lines dumps
+"""
+
+# native imports
+import json
+import os
+from datetime import datetime
+from itertools import islice
+from urllib.parse import unquote
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+# local imports
+from app import app
+from app.models import import_posts, iter_posts
+
+config = app.config
+config.setdefault('TRANSFER_BATCH_SIZE', 500)
+
+COLUMNS = ('post_date', 'post_content', 'post_title', 'post_url', 'post_image', 'post_status', 'post_modified',
+           'comment_status', 'post_password', 'post_likes')
+WP_NS = 'http://wordpress.org/export/'
+CONTENT_NS = '{http://purl.org/rss/1.0/modules/content/}'
+
+
+def is_wxr(filename):
+    return filename.endswith(('.xml', '.wxr'))
+
+
+def parse_date(value):
+    if not value or isinstance(value, datetime):
+        return value or None
+    if value.startswith('0000'):
+        # WordPress drafts have no date
+        return None
+    return datetime.fromisoformat(value)
+
+
+def post_row(values):
+    """
+    A blog_posts row with every column, executemany needs the same keys on each
+    """
+    row = {column: values.get(column) or None for column in COLUMNS}
+    row['post_status'] = row['post_status'] or 'publish'
+    row['post_date'] = parse_date(row['post_date'])
+    if row['post_date'] is None and row['post_status'] == 'publish':
+        # published posts are listed by date, undated ones get the time they were imported
+        row['post_date'] = datetime.now()
+    row['post_modified'] = parse_date(row['post_modified']) or row['post_date']
+    row['comment_status'] = row['comment_status'] or 'open'
+    row['post_likes'] = int(row['post_likes'] or 0)
+    return row
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield post_row(json.loads(line))
+
+
+def read_wxr(stream):
+    """
+    Posts of a WordPress export, each <item> is dropped once read so memory stays flat
+    """
+    channel = None
+    for event, elem in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'channel':
+                channel = elem
+            continue
+        if elem.tag != 'item':
+            continue
+        values = {}
+        for child in elem:
+            if child.tag == 'title':
+                values['post_title'] = child.text
+            elif child.tag == CONTENT_NS + 'encoded':
+                values['post_content'] = child.text
+            elif child.tag.startswith('{' + WP_NS):
+                ns, _, name = child.tag.rpartition('}')
+                if name != 'postmeta':
+                    values[name] = child.text
+                elif child.findtext(f'{ns}}}meta_key') == 'post_image':
+                    values['post_image'] = child.findtext(f'{ns}}}meta_value')
+        if channel is not None:
+            channel.clear()
+        if values.get('post_type', 'post') != 'post':
+            continue
+        values['post_url'] = unquote(values.get('post_name') or '') or f"post-{values.get('post_id')}"
+        values['post_status'] = values.get('status')
+        yield post_row(values)
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+async def import_file(filename, batch_size=None, notify=True):
+    """
+    Insert the posts of a .xml/.wxr (WordPress) or JSON Lines dump, batch_size rows per transaction
+
+    Returns (imported, skipped), posts whose post_url already exists are skipped.
+    notify is passed on to import_posts.
+    """
+    batch_size = batch_size or config['TRANSFER_BATCH_SIZE']
+    imported = skipped = 0
+    with open(filename, 'rb') as i:
+        for batch in batches(read_wxr(i) if is_wxr(filename) else read_jsonl(i), batch_size):
+            count = await import_posts(batch, notify)
+            imported += count
+            skipped += len(batch) - count
+    return imported, skipped
+
+
+def jsonl_line(post):
+    values = {column: post[column] for column in COLUMNS}
+    for column in ('post_date', 'post_modified'):
+        if values[column] is not None:
+            values[column] = values[column].isoformat()
+    return json.dumps(values) + '\n'
+
+
+def wxr_item(post):
+    date = post['post_date'].strftime('%Y-%m-%d %H:%M:%S') if post['post_date'] else '0000-00-00 00:00:00'
+    modified = post['post_modified'].strftime('%Y-%m-%d %H:%M:%S') if post['post_modified'] else date
+    fields = [('wp:post_id', post['id']), ('wp:post_date', date), ('wp:post_modified', modified),
+              ('wp:comment_status', post['comment_status']), ('wp:post_name', post['post_url']),
+              ('wp:status', post['post_status']), ('wp:post_type', 'post'),
+              ('wp:post_password', post['post_password'])]
+    lines = ['<item>', f"<title>{escape(post['post_title'] or '')}</title>",
+             f"<content:encoded>{escape(post['post_content'] or '')}</content:encoded>"]
+    lines += [f'<{tag}>{escape(str(value))}</{tag}>' for tag, value in fields if value is not None]
+    if post['post_image']:
+        lines.append(f"<wp:postmeta><wp:meta_key>post_image</wp:meta_key>"
+                     f"<wp:meta_value>{escape(post['post_image'])}</wp:meta_value></wp:postmeta>")
+    lines.append('</item>')
+    return '\n'.join(lines) + '\n'
+
+
+async def export_file(filename, batch_size=None):
+    """
+    Write every post to a .xml/.wxr (WordPress) or JSON Lines dump, returns the number written
+    """
+    batch_size = batch_size or config['TRANSFER_BATCH_SIZE']
+    count = 0
+    with open(filename + '.tmp', 'w', encoding='utf-8') as o:
+        if is_wxr(filename):
+            o.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/" '
+                    'xmlns:wp="http://wordpress.org/export/1.2/">\n<channel>\n<wp:wxr_version>1.2</wp:wxr_version>\n')
+        async for post in iter_posts(batch_size):
+            o.write(wxr_item(post) if is_wxr(filename) else jsonl_line(post))
+            count += 1
+        if is_wxr(filename):
+            o.write('</channel>\n</rss>\n')
+    os.replace(filename + '.tmp', filename)
+    return count
@@ -1,51 +1,149 @@
 # app/views.py
 
 # native imports
+import asyncio
 import datetime
-from os import urandom, path
+from functools import wraps
+from json import dumps
+from math import ceil
+from mimetypes import guess_type
+from os import environ, makedirs, path
+from secrets import token_hex
+from time import perf_counter, time
 
 # 3rd party imports
 from sanic.exceptions import NotFound
-from sanic.response import redirect
-from sanic_compress import Compress
+from sanic.response import redirect, json, text, file
 from sanic_jinja2 import SanicJinja2
-from sanic_session import InMemorySessionInterface
 from sanic_useragent import SanicUserAgent
 from sanic_auth import Auth, User
 
 # local imports
-from app import app
-from app.forms import WelcomeForm, DatabaseForm, LoginForm
-from app.models import sql_master
+from app import app, assets, models
+from app.cache import PageCache, cached_response
+from app.export import export_site, exported_file
+from app.feeds import Feeds
+from app.likes import LikeBuffer
+from app.passwords import PasswordHasher, TokenBucket, is_hashed
+from app.metrics import db_pool_size, http_in_flight, http_latency, http_requests, render_latency, \
+    render as render_metrics
+from app.search import SearchIndex
+from app.sessions import SessionInterface, SQLiteSessionStore
+from app.settings import BlogSettings, SettingsSnapshot
+from app.streaming import StreamingCompress, precompile, stream_template
+from app.forms import WelcomeForm, DatabaseForm, LoginForm, SettingsForm
+from app.models import init_engine, close_engine, build_uri, create_tables, create_settings, create_user, get_user, \
+    set_password, get_post_by_url, list_posts, on_write, list_searchable_posts, posts_stamp, tbl, tbl2, \
+    increment_likes, get_likes, get_settings, update_settings, list_feed_posts
 
 # initialize imports
-Compress(app)
+StreamingCompress(app)
 SanicUserAgent.init_app(app, default_locale='en_US')
 jinja = SanicJinja2(app)
 config = app.config
-jrender = jinja.render
-session = InMemorySessionInterface(expiry=600)
+config.setdefault('JINJA_CACHE_DIR', '.jinja_cache')
+config.setdefault('TEMPLATE_STREAMING', False)
+config.setdefault('STREAM_CHUNK_SIZE', 4096)
+config.setdefault('SETTINGS_STAMP', 'settings.stamp')
+config.setdefault('SETTINGS_CHECK_INTERVAL', 1)
+site = SettingsSnapshot(get_settings)
+jinja.env.globals.update(asset_url=assets.asset_url, image_url=assets.image_url, srcset=assets.srcset,
+                         background_style=assets.background_style, picture=assets.picture, site=site)
+config.setdefault('SESSION_DB', 'sessions.db')
+config.setdefault('SESSION_EXPIRY', 600)
+config.setdefault('SESSION_PURGE_INTERVAL', 300)
+session_store = SQLiteSessionStore()
+session = SessionInterface(session_store)
+# served from app/static, these never read the session
+STATIC_PREFIXES = ('/assets/', '/css/', '/images/')
 config['AUTH_LOGIN_ENDPOINT'] = 'login'
-
-
-@app.listener('before_server_start')
-async def setup_cfg(app, loop):
-    config['SECRET_KEY'] = urandom(24)
+config.setdefault('ASSETS_BUILD', True)
+config.setdefault('STATIC_EXPORT_DIR', None)
+config.setdefault('EXPORT_GZIP', True)
+config.setdefault('SITE_URL', 'http://127.0.0.1:8000')
+config.setdefault('SLOW_REQUEST_MS', None)
+config.setdefault('SLOW_LOG_PATH', None)
+config.setdefault('PAGE_CACHE_SIZE', 256)
+config.setdefault('PAGE_CACHE_TTL', 300)
+page_cache = PageCache()
+config.setdefault('SEARCH_INDEX_PATH', None)
+config.setdefault('SEARCH_PER_PAGE', 10)
+config.setdefault('SEARCH_REFRESH_INTERVAL', 300)
+search_index = SearchIndex()
+config.setdefault('FEED_SIZE', 20)
+config.setdefault('FEED_REFRESH_INTERVAL', 300)
+feeds = Feeds(list_feed_posts)
+config.setdefault('LIKES_FLUSH_INTERVAL', 5)
+config.setdefault('LIKES_FLUSH_THRESHOLD', 1000)
+like_buffer = LikeBuffer(increment_likes)
+config.setdefault('PASSWORD_HASH_THREADS', 2)
+config.setdefault('LOGIN_IP_BURST', 20)
+config.setdefault('LOGIN_USER_BURST', 5)
+config.setdefault('LOGIN_REFILL_SECONDS', 12)
+hasher = PasswordHasher()
+ip_throttle = TokenBucket()
+user_throttle = TokenBucket()
+# static export refresh state, see refresh_static_export()
+export_running = False
+export_dirty = False
+export_full = False
+
+
+def load_config():
+    """
+    Load config.py / MY_SETTINGS once, workers forked afterwards inherit the result
+
+    SECRET_KEY falls back to BLOG_SECRET_KEY from the environment, or is generated
+    and exported there so spawned workers sign sessions and CSRF tokens alike.
+    """
+    if config.get('CONFIG_LOADED'):
+        return
     config['DEMO_CONTENT'] = True
-    if path.isfile('*.db'):
-        config['SETUP_DB'] = False
-        config['SETUP_BLOG'] = False
-    else:
-        config['SETUP_DB'] = True
-        config['SETUP_BLOG'] = True
+    config['CONFIG_FOUND'] = False
     try:
         cfg = config.from_pyfile('config.py')
         if cfg is None:
             config.from_envvar('MY_SETTINGS')
+        config['CONFIG_FOUND'] = True
         print('Successfully imported config.')
     except FileNotFoundError:
         config['DEMO_CONTENT'] = True
         print('Warning - Config Not Found. Using Defaults.')
+    # a database is set up once a config names one, failing to reach it later is an error, not a new setup
+    config['SETUP_DB'] = not (config['CONFIG_FOUND'] or config.get('DB_URI'))
+    if not config.get('SECRET_KEY'):
+        environ.setdefault('BLOG_SECRET_KEY', token_hex(24))
+        config['SECRET_KEY'] = environ['BLOG_SECRET_KEY']
+    try:
+        # forked workers inherit the compiled templates, spawned ones read the bytecode cache
+        if config['JINJA_CACHE_DIR']:
+            makedirs(config['JINJA_CACHE_DIR'], exist_ok=True)
+        precompile(jinja.env, config['JINJA_CACHE_DIR'])
+    except Exception as error:
+        print(f'Template Precompile Broke! {error}')
+    config['CONFIG_LOADED'] = True
+
+
+@app.listener('before_server_start')
+async def setup_cfg(app, loop):
+    load_config()
+    assets.load()
+    session_store.filename = config['SESSION_DB']
+    session_store.expiry = config['SESSION_EXPIRY']
+    page_cache.maxsize = config['PAGE_CACHE_SIZE']
+    page_cache.ttl = config['PAGE_CACHE_TTL']
+    hasher.threads = config['PASSWORD_HASH_THREADS']
+    ip_throttle.burst, user_throttle.burst = config['LOGIN_IP_BURST'], config['LOGIN_USER_BURST']
+    ip_throttle.refill = user_throttle.refill = config['LOGIN_REFILL_SECONDS']
+    site.stamp_file = config['SETTINGS_STAMP']
+    feeds.size = config['FEED_SIZE']
+    feeds.site_url = config['SITE_URL'].rstrip('/')
+    try:
+        await init_engine()
+        await site.load()
+    except Exception as error:
+        # setup retries the settings read, everything else uses the pool once it is reachable
+        print(f'Warning - Database Not Available. {error}')
 
 
 @app.listener('after_server_start')
@@ -53,19 +151,159 @@ async def notify_server_started(app, loop):
     print('Server successfully started.')
 
 
+@app.listener('after_server_start')
+async def start_search_index(app, loop):
+    async def refresh():
+        # writes in this worker update the index directly, the stamp catches the other workers' writes
+        await refresh_search_index(startup=True)
+        while True:
+            await asyncio.sleep(config['SEARCH_REFRESH_INTERVAL'])
+            await refresh_search_index()
+    loop.create_task(refresh())
+
+
 @app.listener('before_server_stop')
 async def notify_server_stopping(app, loop):
     print('Server shutting down...')
 
 
+@app.listener('after_server_start')
+async def start_session_purge(app, loop):
+    async def purge():
+        while True:
+            await asyncio.sleep(config['SESSION_PURGE_INTERVAL'])
+            try:
+                await session_store.run(session_store.purge)
+            except Exception as error:
+                print(f'Session Purge Broke! {error}')
+    loop.create_task(purge())
+
+
+@app.listener('after_server_start')
+async def start_settings_check(app, loop):
+    async def check():
+        while True:
+            await asyncio.sleep(config['SETTINGS_CHECK_INTERVAL'])
+            try:
+                if await site.check():
+                    page_cache.clear()
+                    feeds.invalidate()
+            except Exception as error:
+                print(f'Settings Check Broke! {error}')
+    loop.create_task(check())
+
+
+@app.listener('after_server_start')
+async def start_feed_refresh(app, loop):
+    async def refresh():
+        # writes in this worker patch the feeds directly, the stamp catches the other workers' writes
+        while True:
+            try:
+                stamp = await posts_stamp()
+                if stamp != feeds.stamp:
+                    await feeds.load(stamp)
+            except Exception as error:
+                print(f'Feed Refresh Broke! {error}')
+            await asyncio.sleep(config['FEED_REFRESH_INTERVAL'])
+    loop.create_task(refresh())
+
+
+@app.listener('after_server_start')
+async def start_like_buffer(app, loop):
+    like_buffer.interval = config['LIKES_FLUSH_INTERVAL']
+    like_buffer.threshold = config['LIKES_FLUSH_THRESHOLD']
+    like_buffer.start(loop)
+
+
+@app.listener('before_server_stop')
+async def flush_like_buffer(app, loop):
+    await like_buffer.stop()
+
+
+@app.listener('before_server_stop')
+async def save_search_index(app, loop):
+    filename = config['SEARCH_INDEX_PATH']
+    if not filename:
+        return
+    try:
+        search_index.save(filename)
+    except Exception as error:
+        print(f'Search Index Save Broke! {error}')
+
+
 @app.listener('after_server_stop')
 async def close_db(app, loop):
+    await close_engine()
+    hasher.close()
     print('Server successfully shutdown.')
 
 
+def jrender(template, request, **context):
+    with render_latency.time(template=template):
+        return jinja.render(template, request, **context)
+
+
+def jrender_stream(template, request, **context):
+    """
+    Like jrender, but streamed as it renders when TEMPLATE_STREAMING is on
+
+    A streamed page still reaches page_cache: cached_page leaves its key on the request.
+    Its render time is recorded once the last chunk is out.
+    """
+    if not config['TEMPLATE_STREAMING']:
+        return jrender(template, request, **context)
+    jinja.update_request_context(request, context)
+    key = request.get('page_cache_key')
+
+    def store(html, rendering):
+        render_latency.observe(rendering, template=template)
+        if key is not None:
+            page_cache.set(key, html.encode(), 'text/html; charset=utf-8')
+    return stream_template(jinja.env.get_template(template), context,
+                           'gzip' in request.headers.get('Accept-Encoding', ''), config['STREAM_CHUNK_SIZE'], store)
+
+
+def route_label(request):
+    route = getattr(request, 'route', None)
+    if route is not None:
+        return route.path
+    return getattr(request, 'uri_template', None) or 'unmatched'
+
+
+def log_slow_request(request, route, status, elapsed):
+    entry = dumps({'time': time(), 'method': request.method, 'route': route, 'path': request.path,
+                   'status': status, 'ms': round(elapsed * 1000, 2)})
+    if config['SLOW_LOG_PATH']:
+        with open(config['SLOW_LOG_PATH'], 'a') as o:
+            o.write(entry + '\n')
+    else:
+        print(f'Slow Request: {entry}')
+
+
+@app.middleware('request')
+async def start_request_timer(request):
+    request['metrics_start'] = perf_counter()
+    http_in_flight.inc()
+
+
+@app.middleware('response')
+async def record_request_metrics(request, response):
+    start = request.get('metrics_start')
+    if start is None:
+        return
+    elapsed = perf_counter() - start
+    route = route_label(request)
+    status = response.status if response is not None else 500
+    http_in_flight.dec()
+    http_latency.observe(elapsed, route=route)
+    http_requests.inc(route=route, method=request.method, status=status)
+    if config['SLOW_REQUEST_MS'] is not None and elapsed * 1000 >= config['SLOW_REQUEST_MS']:
+        log_slow_request(request, route, status, elapsed)
+
+
 @app.middleware('request')
 async def add_session_to_request(request):
-    await session.open(request)
+    await session.open(request, load=not request.path.startswith(STATIC_PREFIXES))
 
 
 @app.middleware('response')
@@ -73,6 +311,46 @@ async def save_session(request, response):
     await session.save(request, response)
 
 
+@app.middleware('request')
+async def maintenance_mode(request):
+    """
+    While maintenance_mode is on, anonymous visitors only reach login, setup and static files
+    """
+    if not site.maintenance_mode or auth.current_user(request) is not None:
+        return
+    if request.path in ('/login', '/setup') or request.path.startswith(STATIC_PREFIXES):
+        return
+    page = dict()
+    page['title'] = 'Maintenance'
+    page['header'] = 'Down For Maintenance'
+    page['text'] = 'We\'ll be back shortly.'
+    return jrender('page.html', request, page=page, status=503, headers={'Retry-After': '600'})
+
+
+@app.middleware('response')
+async def robots_header(request, response):
+    if site.seo_hidden and response is not None:
+        response.headers['X-Robots-Tag'] = 'noindex, nofollow'
+
+
+@app.middleware('request')
+async def serve_static_export(request):
+    """
+    With STATIC_EXPORT_DIR set, anonymous GETs of exported pages skip the database and Jinja
+    """
+    out_dir = config['STATIC_EXPORT_DIR']
+    if not out_dir or request.method != 'GET' or request.query_string:
+        return
+    location = exported_file(out_dir, request.path)
+    if location is None or auth.current_user(request) is not None:
+        return
+    headers = {'Cache-Control': 'public, no-cache', 'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and path.isfile(location + '.gz'):
+        headers['Content-Encoding'] = 'gzip'
+        return await file(location + '.gz', headers=headers, mime_type=guess_type(location)[0])
+    return await file(location, headers=headers)
+
+
 @app.exception(NotFound)
 async def ignore_404s(request, exception):
     page = dict()
@@ -84,17 +362,158 @@ async def ignore_404s(request, exception):
 auth = Auth(app)
 
 
+@on_write
+def invalidate_pages(table, action, row):
+    page_cache.clear()
+
+
+@on_write
+def refresh_settings(table, action, row):
+    if table is not tbl2:
+        return
+    site.swap(row)
+    site.bump()
+
+
+@on_write
+def update_feeds(table, action, row):
+    if table is tbl2:
+        feeds.invalidate()
+    elif action == 'delete':
+        feeds.remove(row['id'])
+    else:
+        feeds.update(row)
+
+
+@on_write
+def update_search_index(table, action, row):
+    if table is not tbl:
+        return
+    if action == 'delete':
+        search_index.remove(row['id'])
+    else:
+        search_index.add(row)
+
+
+@on_write
+def refresh_static_export(table, action, row):
+    global export_running, export_dirty, export_full
+    if table not in (tbl, tbl2) or not config['STATIC_EXPORT_DIR']:
+        return
+    # settings show on every page, a change renders them all again
+    export_full = export_full or table is tbl2
+    export_dirty = True
+    if not export_running:
+        export_running = True
+        asyncio.ensure_future(run_static_export())
+
+
+async def run_static_export():
+    """
+    Bring the static export up to date, again if more writes arrived meanwhile
+    """
+    global export_running, export_dirty, export_full
+    try:
+        while export_dirty:
+            full, export_dirty, export_full = export_full, False, False
+            try:
+                await export_site(jinja.env, config['STATIC_EXPORT_DIR'], config['SITE_URL'], config['EXPORT_GZIP'],
+                                  full=full)
+            except Exception as error:
+                print(f'Static Export Broke! {error}')
+    finally:
+        export_running = False
+
+
+async def refresh_search_index(startup=False):
+    """
+    Rebuild the search index when blog_posts changed since the stamp it was built from
+
+    At startup a saved index is reused if its stamp still matches, an unreadable one is rebuilt.
+    """
+    filename = config['SEARCH_INDEX_PATH']
+    try:
+        stamp = await posts_stamp()
+        if stamp == search_index.stamp:
+            return
+        if startup and filename and path.isfile(filename):
+            try:
+                if search_index.load(filename) == stamp:
+                    print(f'Loaded search index of {len(search_index)} posts.')
+                    return
+            except Exception as error:
+                print(f'Search Index Load Broke! {error}')
+                search_index.clear()
+        # fetched before clearing so searches never see an empty index
+        rows = await list_searchable_posts()
+        search_index.clear()
+        for fetch in rows:
+            search_index.add(fetch)
+        # the stamp read before the fetch, a write racing it triggers another rebuild
+        search_index.stamp = stamp
+        print(f'Built search index of {len(search_index)} posts.')
+    except Exception as error:
+        print(f'Search Index Broke! {error}')
+
+
+def cached_page(handler):
+    """
+    Serve anonymous GETs from page_cache, logged in sessions always render
+    """
+    @wraps(handler)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or auth.current_user(request) is not None:
+            return await handler(request, *args, **kwargs)
+        key = (request.path, request.query_string)
+        page = page_cache.get(key)
+        if page is None:
+            request['page_cache_key'] = key
+            response = await handler(request, *args, **kwargs)
+            # streamed pages have no body yet and store themselves when done
+            if response.status != 200 or getattr(response, 'body', None) is None:
+                return response
+            page = page_cache.set(key, response.body, response.content_type)
+        return cached_response(request, page)
+    return wrapper
+
+
+def database_setup_allowed(request):
+    """
+    Anyone may pick the database before one is configured, afterwards only a logged in user
+    """
+    configured = config['CONFIG_FOUND'] or config.get('DB_URI') or path.isfile('config.py')
+    return not configured or auth.current_user(request) is not None
+
+
 async def setup(request):
     page = dict()
-    if config['SETUP_DB']:
+    if database_setup_allowed(request) and (config['SETUP_DB'] or 'database' in request.args):
         dform = DatabaseForm(request)
         if request.method == 'POST' and dform.validate():
             print('Setting up DB')
-            data = (dform.user.data, dform.password.data, dform.name.data, dform.host.data, dform.type.data)
-            await sql_master(data)
-            # if not valid:
-            #     print('Error - DB Not Valid')
-            #     return redirect(app.url_for('setup'))
+            previous = config.get('DB_URI'), config.get('DB_TYPE')
+            config['DB_URI'] = build_uri(dform.type.data, dform.name.data, dform.user.data, dform.password.data,
+                                         dform.host.data)
+            config['DB_TYPE'] = dform.type.data
+            await close_engine()
+            valid = await create_tables()
+            if valid:
+                try:
+                    # an existing blog keeps its settings, setup then ends here
+                    await site.load()
+                except Exception as error:
+                    print(f'Settings Load Broke! {error}')
+                    valid = False
+            if not valid:
+                print('Error - DB Not Valid')
+                config['DB_URI'], config['DB_TYPE'] = previous
+                await close_engine()
+                return redirect(app.url_for('setup'))
+            # later assignments win, so appending keeps the rest of an existing config.py
+            with open('config.py', 'at') as o:
+                o.write(f'DB_URI = {config["DB_URI"]!r}\n')
+                o.write(f'DB_TYPE = {config["DB_TYPE"]!r}\n')
+            print('Wrote config.py')
             config['SETUP_DB'] = False
             print('DB Setup Finished')
             return redirect(app.url_for('setup'))
@@ -102,9 +521,22 @@ async def setup(request):
         page['header'] = 'Setup Database'
         page['text'] = 'Below you should enter your database connection details.'
         return jrender('page.html', request, page=page, form=dform)
-    elif config['SETUP_BLOG']:
+    if not site.loaded:
+        try:
+            await site.load()
+        except Exception as error:
+            # without knowing whether settings exist, never offer to create the admin account
+            print(f'Settings Load Broke! {error}')
+            page['title'] = 'Setup'
+            page['header'] = 'Database Unavailable'
+            page['text'] = 'The database could not be reached, please try again shortly.'
+            return jrender('page.html', request, page=page, status=503)
+    if site.current is None:
         print('Setting up Blog')
         wform = WelcomeForm(request)
+        if request.method != 'POST':
+            # an empty form reads as every switch turned off
+            wform.seo.data = True
         if request.method == 'POST' and wform.validate():
             user = User(id=1, name=wform.username.data)
             auth.login_user(request, user)
@@ -123,11 +555,12 @@ async def setup(request):
             #     print('Demo content broke')
             #     return redirect(app.url_for('setup'))
             # print('Finished With Demo Content')
-            data = (wform.title.data, wform.username.data, wform.password.data, wform.email.data)
-            finish_up = await sql_master(data)
+            finish_up = await create_settings(wform.title.data, wform.username.data, wform.seo.data)
+            if finish_up:
+                finish_up = await create_user(wform.username.data, await hasher.hash(wform.password.data),
+                                              wform.email.data)
             if not finish_up:
                 return redirect(app.url_for('setup'))
-            config['SETUP_BLOG'] = False
             return redirect('/')
         page['title'] = 'Blog First Start'
         page['header'] = 'Welcome'
@@ -140,47 +573,144 @@ async def setup(request):
                    js_head_end='<script defer>window.setTimeout(function(){ window.location = "/"; },3000);</script>')
 
 
+@cached_page
 async def index(request):
-    data = (None, 4)
     try:
-        fetch = await sql_master(data)
-        if fetch is None:
+        fetch, next_cursor = await list_posts(request.args.get('after'))
+        if not fetch:
             page = dict()
             page['header'] = 'No Posts Found :('
             page['text'] = 'Sorry, We couldn\'t find any posts.'
             return jrender('page.html', request, page=page)
-        return jrender('index.html', request, page=fetch)
+        return jrender_stream('index.html', request, page=fetch, next_cursor=next_cursor)
     except Exception as error:
         print(f'Index Request Broke! {error}')
         raise NotFound("404 Error", status_code=404)
 
 
+@cached_page
 async def post(request, name):
-    data = (f'SELECT * FROM blog_posts WHERE post_name="{name}";', 1)
     try:
-        fetch = await sql_master(data)
+        fetch = await get_post_by_url(name)
         if not fetch:
             raise NotFound("404 Error", status_code=404)
-        return jrender('post.html', request, post=fetch)
+        fetch['post_likes'] = (fetch['post_likes'] or 0) + like_buffer.unflushed(fetch['id'])
+        return jrender_stream('post.html', request, post=fetch)
     except Exception as error:
         print(f'Post Broke! {error}')
         raise NotFound("404 Error", status_code=404)
 
 
+async def like(request, name):
+    """
+    POST adds a like, GET only reads the count, post pages fetch it since their cached copy goes stale
+    """
+    fetch = await like_buffer.lookup(name, get_likes)
+    if not fetch:
+        raise NotFound("404 Error", status_code=404)
+    if request.method == 'POST':
+        like_buffer.add(fetch['id'])
+    return json({'likes': (fetch['post_likes'] or 0) + like_buffer.unflushed(fetch['id'])},
+                headers={'Cache-Control': 'no-store'})
+
+
+async def search(request):
+    query = request.args.get('q', '')
+    per_page = config['SEARCH_PER_PAGE']
+    try:
+        page_no = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        page_no = 1
+    results, total = search_index.search(query, page_no, per_page)
+    return jrender('search.html', request, query=query, results=results, total=total, page_no=page_no,
+                   pages=ceil(total / per_page))
+
+
+async def feed_response(request, name):
+    """
+    Serve a feed document from memory, unchanged ones answer conditional GETs with 304
+    """
+    if not feeds.loaded:
+        await feeds.load()
+    return cached_response(request, feeds.document(name, site.title))
+
+
+async def rss_feed(request):
+    return await feed_response(request, 'rss')
+
+
+async def atom_feed(request):
+    return await feed_response(request, 'atom')
+
+
+async def sitemap(request):
+    return await feed_response(request, 'sitemap')
+
+
+async def metrics(request):
+    if models.db is not None:
+        db_pool_size.set(models.db.freesize, state='idle')
+        db_pool_size.set(models.db.size - models.db.freesize, state='in_use')
+    return text(render_metrics(), content_type='text/plain; version=0.0.4')
+
+
 @auth.login_required
 async def dashboard(request):
     return jrender('admin.html', request, pagename='Dashboard')
 
 
+def login_throttled(request, username):
+    """
+    Retry-After seconds when this IP or username is out of login attempts, else None
+    """
+    ip = request.remote_addr or request.ip
+    if not ip_throttle.allow(ip):
+        return ip_throttle.retry_after(ip)
+    if not user_throttle.allow(username):
+        return user_throttle.retry_after(username)
+    return None
+
+
+@auth.login_required
+async def admin_settings(request):
+    page = dict()
+    status = 200
+    sform = SettingsForm(request)
+    if request.method == 'POST' and sform.validate():
+        if await update_settings(**{field.name: field.data for field in sform if field.name in BlogSettings._fields}):
+            page['text'] = 'Settings saved.'
+        else:
+            # the submitted values stay in the form, so they can be sent again
+            page['text'] = 'Settings could not be saved, please try again shortly.'
+            status = 503
+    elif request.method != 'POST':
+        for field in sform:
+            if field.name in BlogSettings._fields:
+                field.data = getattr(site, field.name)
+    page['title'] = 'Settings'
+    page['header'] = 'Blog Settings'
+    return jrender('page.html', request, page=page, form=sform, status=status)
+
+
 async def login(request):
     page = dict()
     lform = LoginForm(request)
     if request.method == 'POST' and lform.validate():
         fuser = lform.username.data
         fpass = lform.password.data
-        data = (f'SELECT * FROM "blog_users" WHERE `username`="{fuser}" AND `password`="{fpass}";', 1)
-        fetch = await sql_master(data)
-        if fetch is not None:
+        # checked before the lookup and the hash, so a flood costs neither
+        retry = login_throttled(request, fuser)
+        if retry is not None:
+            page['title'] = 'Login'
+            page['header'] = 'Too Many Login Attempts'
+            page['text'] = f'Please try again in {retry} seconds.'
+            return jrender('page.html', request, page=page, status=429, headers={'Retry-After': str(retry)})
+        fetch = await get_user(fuser)
+        valid = await hasher.verify(fpass, fetch['password'] if fetch is not None else None)
+        if valid and not is_hashed(fetch['password']):
+            # stored before hashing was added, replace it now that the plain value is known
+            await set_password(fuser, await hasher.hash(fpass))
+        if valid:
             user = User(id=1, name=fuser)
             auth.login_user(request, user)
             page['title'] = 'Login'
@@ -217,18 +747,44 @@ async def logout(request):
                    js_head_end='<script defer>window.setTimeout(function(){ window.location = "/"; },3000);</script>')
 
 
+async def asset(request, name):
+    """
+    Fingerprinted files from app/static/build, precompressed copies when accepted
+    """
+    if name not in assets.served:
+        raise NotFound("404 Error", status_code=404)
+    location = path.join(assets.BUILD_DIR, name)
+    headers = {'Cache-Control': 'public, max-age=31536000, immutable'}
+    if name.endswith('.css'):
+        headers['Vary'] = 'Accept-Encoding'
+        accept = request.headers.get('Accept-Encoding', '')
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in accept and path.isfile(location + suffix):
+                headers['Content-Encoding'] = encoding
+                return await file(location + suffix, headers=headers, mime_type='text/css')
+    return await file(location, headers=headers)
+
+
 async def redirect_index(request):
     return redirect('/')
 
 # Static Files
 app.static('images/', './app/static/images/')
 app.static('css/', './app/static/css/')
+app.add_route(asset, 'assets/<name:path>')
 
 # Routes
 app.add_route(setup, 'setup', methods=['GET', 'POST'])
 app.add_route(index, '/')
+app.add_route(search, 'search')
+app.add_route(metrics, 'metrics')
+app.add_route(rss_feed, 'feed.xml')
+app.add_route(atom_feed, 'atom.xml')
+app.add_route(sitemap, 'sitemap.xml')
 app.add_route(post, '/<name>')
+app.add_route(like, '/<name>/like', methods=['GET', 'POST'])
 app.add_route(dashboard, 'admin')
+app.add_route(admin_settings, 'admin/settings', methods=['GET', 'POST'])
 app.add_route(login, 'login', methods=['GET', 'POST'])
 app.add_route(logout, 'logout')
 app.add_route(redirect_index, '/index.html')
@@ -0,0 +1,207 @@
+# bench/bench.py
+"""
+Load test the blog routes against an in-process fake database
+
+    python bench/bench.py --posts 5000 --concurrency 32 --duration 10
+    python bench/bench.py --compare bench/results/<earlier run>.json
+"""
+
+# native imports
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = {'index': lambda urls: '/',
+          'post': lambda urls: '/' + random.choice(urls),
+          'login': lambda urls: '/login',
+          'image': lambda urls: '/images/coffee.jpg',
+          'css': lambda urls: '/css/style.css',
+          'search': lambda urls: '/search?q=synthetic+post'}
+DEFAULT_ROUTES = ('index', 'post', 'login', 'image', 'css')
+
+
+def serve(host, port, posts, page_cache):
+    """
+    Child process: boot the app from run.py on top of FakeDB
+    """
+    import inspect
+    from fakedb import FakeDB, install
+    from run import app
+    from app import views
+    install(views, FakeDB(posts))
+    if not page_cache:
+        app.config['PAGE_CACHE_SIZE'] = 0
+    kwargs = dict(host=host, port=port, debug=False, access_log=False, workers=1)
+    if 'single_process' in inspect.signature(app.run).parameters:
+        # newer Sanic spawns workers, which would re-import and lose the fake
+        kwargs['single_process'] = True
+    app.run(**kwargs)
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server did not start on {host}:{port}')
+
+
+async def fetch(reader, writer, host, path):
+    """
+    One keep-alive HTTP/1.1 GET, returns the status code
+    """
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept-Encoding: gzip\r\n\r\n'.encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status
+
+
+async def client(host, port, route, urls, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.monotonic() < deadline:
+            path = ROUTES[route](urls)
+            start = time.perf_counter()
+            try:
+                status = await fetch(reader, writer, host, path)
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                errors.append(path)
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(path)
+    finally:
+        writer.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    index = max(int(round(pct / 100 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+async def run_route(host, port, route, urls, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(*(client(host, port, route, urls, deadline, latencies, errors)
+                           for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {'requests': len(latencies), 'errors': len(errors), 'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': ms(percentile(latencies, 50)), 'p95_ms': ms(percentile(latencies, 95)),
+            'p99_ms': ms(percentile(latencies, 99)),
+            'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current, tolerance):
+    """
+    Print per-route changes and return the routes that regressed beyond tolerance percent
+    """
+    regressed = []
+    for route, now in current['routes'].items():
+        before = previous['routes'].get(route)
+        if not before or not before['rps'] or not before['p99_ms'] or now['p99_ms'] is None:
+            continue
+        rps = (now['rps'] - before['rps']) / before['rps'] * 100
+        p99 = (now['p99_ms'] - before['p99_ms']) / before['p99_ms'] * 100
+        print(f'{route:>8}: rps {rps:+.1f}%  p99 {p99:+.1f}%')
+        if rps < -tolerance or p99 > tolerance:
+            regressed.append(route)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=1000, help='synthetic posts to seed')
+    parser.add_argument('--concurrency', type=int, default=16, help='keep-alive connections per route')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load per route')
+    parser.add_argument('--routes', default=','.join(DEFAULT_ROUTES), help=f'any of {", ".join(ROUTES)}')
+    parser.add_argument('--no-page-cache', action='store_true', help='render every page')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--out', help='result file, default bench/results/<timestamp>.json')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    parser.add_argument('--tolerance', type=float, default=10, help='allowed regression in percent')
+    args = parser.parse_args()
+
+    routes = [route.strip() for route in args.routes.split(',') if route.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f'unknown routes: {", ".join(sorted(unknown))}')
+    urls = [f'post-{post_id}' for post_id in range(1, args.posts + 1)]
+
+    server = multiprocessing.Process(target=serve, args=(args.host, args.port, args.posts, not args.no_page_cache),
+                                     daemon=True)
+    server.start()
+    try:
+        wait_for_port(args.host, args.port)
+        results = {}
+        for route in routes:
+            results[route] = asyncio.run(run_route(args.host, args.port, route, urls,
+                                                   args.concurrency, args.duration))
+            print(f'{route:>8}: {json.dumps(results[route])}')
+    finally:
+        server.terminate()
+        server.join()
+
+    report = {'date': datetime.now().isoformat(), 'revision': git_revision(),
+              'settings': {key: value for key, value in vars(args).items() if key not in ('out', 'compare')},
+              'routes': results}
+    out = args.out or os.path.join(ROOT, 'bench', 'results', f'{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as o:
+        json.dump(report, o, indent=2)
+    print(f'Saved {out}')
+
+    if args.compare:
+        with open(args.compare) as i:
+            regressed = compare(json.load(i), report, args.tolerance)
+        if regressed:
+            print(f'Regressed: {", ".join(regressed)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
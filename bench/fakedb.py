@@ -0,0 +1,92 @@
+# bench/fakedb.py
+
+# native imports
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+LOREM = ('Qui ullamco consectetur aute fugiat officia ullamco proident Lorem ad irure. Sint eu ut consectetur ut esse '
+         'veniam laboris adipisicing aliquip minim anim labore commodo. Incididunt eu enim enim ipsum Lorem commodo '
+         'tempor duis eu ullamco tempor elit occaecat sit. Culpa eu sit voluptate ullamco ad irure. ')
+IMAGES = ('coffee.jpg', 'road.jpg', 'road_big.jpg', 'shopping.jpg', 'dog.png')
+# data-access functions views.py imports from app.models
+PATCHED = ('init_engine', 'close_engine', 'get_user', 'get_post_by_url', 'list_posts', 'list_searchable_posts',
+           'posts_stamp', 'increment_likes')
+
+
+class FakeDB:
+    """
+    In-process stand-in for app.models seeded with synthetic published posts
+    """
+
+    def __init__(self, posts=1000):
+        start = datetime(2018, 1, 1)
+        self.posts = {}
+        for post_id in range(1, posts + 1):
+            date = start + timedelta(hours=post_id)
+            self.posts[post_id] = {'id': post_id, 'post_date': date, 'post_modified': date,
+                                   'post_title': f'Synthetic post {post_id}', 'post_url': f'post-{post_id}',
+                                   'post_image': IMAGES[post_id % len(IMAGES)], 'post_status': 'publish',
+                                   'post_content': LOREM * 4, 'comment_status': 'open', 'post_password': 'None',
+                                   'post_likes': 0}
+        self.by_url = {post['post_url']: post for post in self.posts.values()}
+        # (post_date, id) ascending, the feed walks it backwards
+        self.keys = sorted((post['post_date'], post['id']) for post in self.posts.values())
+
+    def urls(self):
+        return list(self.by_url)
+
+    async def init_engine(self):
+        return None
+
+    async def close_engine(self):
+        return None
+
+    async def get_user(self, username):
+        return None
+
+    async def get_settings(self):
+        return {'title': 'Benchmark', 'owner': 'bench', 'seo_hidden': False, 'https': False, 'short_urls': False,
+                'allow_comments': False, 'maintenance_mode': False}
+
+    async def get_post_by_url(self, url):
+        post = self.by_url.get(url)
+        return dict(post) if post is not None else None
+
+    async def list_posts(self, after=None, limit=4):
+        from app.models import decode_cursor, encode_cursor
+        end = len(self.keys) if after is None else bisect_left(self.keys, decode_cursor(after))
+        keys = self.keys[max(end - limit - 1, 0):end][::-1]
+        rows = []
+        for _, post_id in keys:
+            post = self.posts[post_id]
+            rows.append({'id': post_id, 'post_date': post['post_date'], 'post_title': post['post_title'],
+                         'post_url': post['post_url'], 'post_image': post['post_image'],
+                         'post_excerpt': post['post_content'][:200]})
+        if len(rows) > limit:
+            return rows[:limit], encode_cursor(rows[limit - 1])
+        return rows, None
+
+    async def list_searchable_posts(self):
+        return [dict(post) for post in self.posts.values()]
+
+    async def list_feed_posts(self):
+        return [dict(post) for post in self.posts.values()]
+
+    async def posts_stamp(self):
+        return [len(self.posts), max(self.posts, default=None), None]
+
+    async def increment_likes(self, counts):
+        for post_id, n in counts.items():
+            if post_id in self.posts:
+                self.posts[post_id]['post_likes'] += n
+
+
+def install(views, db):
+    """
+    Point the names views.py imported from app.models at db
+    """
+    for name in PATCHED:
+        setattr(views, name, getattr(db, name))
+    views.like_buffer.flush_func = db.increment_likes
+    views.site.load_func = db.get_settings
+    views.feeds.load_func = db.list_feed_posts
@@ -1,5 +1,94 @@
 # run.py
-from app import app
+
+# native imports
+import argparse
+import asyncio
+import os
+import socket
+
+# local imports
+from app import app, assets
+from app.export import export_site
+from app.models import init_engine, close_engine, create_tables
+from app.transfer import export_file, import_file
+from app.views import load_config, jinja
+
+
+def bind_socket(host, port, reuse_port):
+    """
+    Listening socket shared by all workers
+
+    With SO_REUSEPORT a second launcher can bind the same port while this one
+    drains, which is how a release is swapped in without refusing connections.
+    """
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+async def export(full):
+    config = app.config
+    await init_engine()
+    try:
+        count = await export_site(jinja.env, config['STATIC_EXPORT_DIR'] or 'export', config['SITE_URL'],
+                                  config['EXPORT_GZIP'], full)
+        print(f'Exported {count} changed posts.')
+    finally:
+        await close_engine()
+
+
+async def transfer(import_from, export_to, batch_size):
+    await init_engine()
+    try:
+        if import_from:
+            await create_tables()
+            # this process serves nothing, the write hooks would only build indexes and exports in memory
+            imported, skipped = await import_file(import_from, batch_size, notify=False)
+            print(f'Imported {imported} posts, skipped {skipped} with an existing post_url.')
+        if export_to:
+            print(f'Exported {await export_file(export_to, batch_size)} posts.')
+    finally:
+        await close_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the blog server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--prod', action='store_true', help='multiple workers, debug off')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes with --prod')
+    parser.add_argument('--reuse-port', action='store_true', help='bind with SO_REUSEPORT for zero downtime reloads')
+    parser.add_argument('--pid-file', help='write the master pid here with --prod')
+    parser.add_argument('--export', action='store_true', help='render published posts to STATIC_EXPORT_DIR and exit')
+    parser.add_argument('--full', action='store_true', help='with --export, render every post again')
+    parser.add_argument('--import-posts', metavar='FILE', help='load posts from a WordPress .xml or JSON Lines dump')
+    parser.add_argument('--export-posts', metavar='FILE', help='dump every post to a WordPress .xml or JSON Lines file')
+    parser.add_argument('--batch-size', type=int, help='rows per transaction/query for --import/--export-posts')
+    args = parser.parse_args()
+
+    # once in the master, workers inherit config and SECRET_KEY
+    load_config()
+    if args.import_posts or args.export_posts:
+        asyncio.run(transfer(args.import_posts, args.export_posts, args.batch_size))
+        return
+    if app.config['ASSETS_BUILD']:
+        assets.build()
+    if args.export:
+        asyncio.run(export(args.full))
+        return
+    if not args.prod:
+        app.run(host=args.host, port=args.port, debug=True)
+        return
+    if args.pid_file:
+        with open(args.pid_file, 'w') as o:
+            o.write(str(os.getpid()))
+    sock = bind_socket(args.host, args.port, args.reuse_port)
+    app.run(sock=sock, workers=args.workers, debug=False, access_log=False)
+
 
 if __name__ == '__main__':
-    app.run(host='127.0.0.1', port=8000, debug=True)
+    main()